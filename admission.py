@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+class EndpointLimiter:
+    """Bounds concurrent work for one endpoint, with a per-user cap and a bounded wait queue."""
+
+    # Seconds a caller should back off after hitting its own per-user limit
+    USER_LIMIT_RETRY_AFTER = 2
+
+    def __init__(self, name, max_concurrent, max_queue, per_user, queue_timeout):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.per_user = per_user
+        self.queue_timeout = queue_timeout
+        self.cond = threading.Condition()
+        self.active = 0
+        self.waiters = deque()
+        self.user_inflight = {}
+        self.admitted = 0
+        self.rejected = {'user_limit': 0, 'queue_full': 0, 'queue_timeout': 0}
+
+    def acquire(self, user):
+        # Returns None when admitted, otherwise the rejection reason
+        with self.cond:
+            if self.user_inflight.get(user, 0) >= self.per_user:
+                self.rejected['user_limit'] += 1
+                return 'user_limit'
+            # Queued requests count towards the user's limit too
+            self.user_inflight[user] = self.user_inflight.get(user, 0) + 1
+            # release() hands freed slots straight to waiters, so a free slot
+            # here always means nobody is queued ahead of us
+            if self.active < self.max_concurrent:
+                self.active += 1
+            else:
+                if len(self.waiters) >= self.max_queue:
+                    self._drop_user(user)
+                    self.rejected['queue_full'] += 1
+                    return 'queue_full'
+                waiter = {'granted': False}
+                self.waiters.append(waiter)
+                deadline = time.monotonic() + self.queue_timeout
+                while not waiter['granted']:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.waiters.remove(waiter)
+                        self._drop_user(user)
+                        self.rejected['queue_timeout'] += 1
+                        return 'queue_timeout'
+                    self.cond.wait(remaining)
+                # The slot stays counted in self.active across the handoff
+            self.admitted += 1
+            return None
+
+    def release(self, user):
+        with self.cond:
+            self._drop_user(user)
+            if self.waiters:
+                self.waiters.popleft()['granted'] = True
+                self.cond.notify_all()
+            else:
+                self.active -= 1
+
+    def _drop_user(self, user):
+        count = self.user_inflight.get(user, 0) - 1
+        if count > 0:
+            self.user_inflight[user] = count
+        else:
+            self.user_inflight.pop(user, None)
+
+    def retry_after(self, reason):
+        # A per-user rejection only depends on the caller's own in-flight work
+        if reason == 'user_limit':
+            return self.USER_LIMIT_RETRY_AFTER
+        with self.cond:
+            # Rough estimate: one queue timeout per full round of queued work
+            rounds = 1 + len(self.waiters) // max(self.max_concurrent, 1)
+        return max(1, int(rounds * self.queue_timeout))
+
+    def stats(self):
+        with self.cond:
+            return {
+                'active': self.active,
+                'queue_depth': len(self.waiters),
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'per_user': self.per_user,
+                'admitted': self.admitted,
+                'rejected': dict(self.rejected)
+            }
+
+def make_limiter(name, max_concurrent, max_queue, per_user, queue_timeout):
+    prefix = f'ADMISSION_{name.upper()}_'
+    return EndpointLimiter(
+        name,
+        int(os.getenv(prefix + 'MAX_CONCURRENT', max_concurrent)),
+        int(os.getenv(prefix + 'MAX_QUEUE', max_queue)),
+        int(os.getenv(prefix + 'PER_USER', per_user)),
+        float(os.getenv(prefix + 'QUEUE_TIMEOUT', queue_timeout))
+    )
+
+@contextmanager
+def admission(limiter, user):
+    # Yields None when admitted (the slot is released on exit), otherwise the rejection reason
+    reason = limiter.acquire(user)
+    try:
+        yield reason
+    finally:
+        if reason is None:
+            limiter.release(user)
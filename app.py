@@ -3,9 +3,11 @@ import os
 from dotenv import load_dotenv
 from ai21 import AI21Client
 from ai21.models.chat import ChatMessage
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
 from flask import Flask, render_template_string, request, redirect, url_for, session, flash, send_file
 from werkzeug.utils import secure_filename
+from werkzeug.middleware.proxy_fix import ProxyFix
 import tempfile
 import docx
 import PyPDF2
@@ -15,6 +17,7 @@ from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
 from datetime import datetime
 import re
+from functools import wraps
 from gtts import gTTS
 from faster_whisper import WhisperModel
 import io
@@ -23,6 +26,7 @@ import pytesseract
 from flask_cors import CORS
 import bcrypt
 import markdown
+from admission import admission, make_limiter
 
 load_dotenv()
 
@@ -38,6 +42,18 @@ MONGO_URI = os.getenv("MONGO_URI")
 mongo_client = MongoClient(MONGO_URI)
 db = mongo_client["chatbot"]
 chats = db["chats"]
+# Archived conversations live in their own collection, one document per chat,
+# with a precomputed preview so listings never have to load full histories.
+chat_archives = db["chat_archives"]
+chat_archives_index_ready = False
+
+CHATS_HISTORY_PAGE_SIZE = 50
+CHATS_HISTORY_MAX_PAGE_SIZE = 200
+# Characters of the first/last message kept in an archived chat's preview
+CHAT_PREVIEW_LENGTH = 300
+
+# Comma-separated emails allowed to view operational endpoints such as /api/admission_stats
+ADMIN_EMAILS = {e.strip().lower() for e in os.getenv('ADMIN_EMAILS', '').split(',') if e.strip()}
 
 ALLOWED_EXTENSIONS = {'txt', 'pdf', 'docx', 'png', 'jpg', 'jpeg'}
 
@@ -45,6 +61,10 @@ ALLOWED_EXTENSIONS = {'txt', 'pdf', 'docx', 'png', 'jpg', 'jpeg'}
 app = Flask(__name__)
 app.secret_key = os.getenv('FLASK_SECRET_KEY', 'supersecret')
 CORS(app, supports_credentials=True)
+# Behind a reverse proxy, set PROXY_FIX_X_FOR to the number of proxies so
+# request.remote_addr (used to rate-limit anonymous /stt and /tts) is the real client
+if os.getenv('PROXY_FIX_X_FOR'):
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=int(os.getenv('PROXY_FIX_X_FOR')))
 
 client = AI21Client(api_key=api_key)
 
@@ -118,6 +138,39 @@ def is_valid_password(password):
         return False
     return True
 
+# Each expensive route gets its own pool so slow uploads or transcriptions
+# cannot take slots away from interactive chat.
+limiters = {
+    'chat': make_limiter('chat', 8, 16, 2, 10),
+    'upload': make_limiter('upload', 2, 4, 1, 30),
+    'stt': make_limiter('stt', 2, 4, 1, 15),
+    'tts': make_limiter('tts', 4, 8, 2, 10)
+}
+
+def admission_rejection(limiter, reason):
+    # Per-user limits are the caller's fault (429); a saturated endpoint is ours (503)
+    status = 429 if reason == 'user_limit' else 503
+    return status, {'Retry-After': str(limiter.retry_after(reason))}
+
+def admission_controlled(name, login_required=True):
+    limiter = limiters[name]
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            user = session.get('user_email')
+            if not user:
+                # Anonymous callers never take a slot on login-only routes
+                if login_required:
+                    return jsonify({'error': 'Not logged in'}), 401
+                user = request.remote_addr
+            with admission(limiter, user) as reason:
+                if reason:
+                    status, headers = admission_rejection(limiter, reason)
+                    return jsonify({'error': 'Server busy, please retry shortly.', 'reason': reason}), status, headers
+                return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
 EMAIL_AND_CHAT_FORM = '''
 <!doctype html>
 <title>Chatbot</title>
@@ -237,12 +290,28 @@ function playPauseAnswer(btn) {
 {% endif %}
 '''
 
+# Form actions on the HTML page that do the same heavy work as the JSON endpoints
+INDEX_ACTION_LIMITERS = {'Upload': 'upload', 'Ask': 'chat'}
+
 @app.route('/', methods=['GET', 'POST'])
 def index():
+    user_email = session.get('user_email')
+    name = INDEX_ACTION_LIMITERS.get(request.form.get('action')) if request.method == 'POST' else None
+    if not (user_email and name):
+        return index_page()
+    limiter = limiters[name]
+    with admission(limiter, user_email) as reason:
+        if reason:
+            status, headers = admission_rejection(limiter, reason)
+            flash(f"Server busy, please retry in {headers['Retry-After']} seconds.")
+            return index_page(handle_form=False), status, headers
+        return index_page()
+
+def index_page(handle_form=True):
     user_email = session.get('user_email')
     chat_pairs = session.get('current_chat', [])
     answer = chat_pairs[-1][1] if chat_pairs else None
-    if request.method == 'POST':
+    if request.method == 'POST' and handle_form:
         action = request.form.get('action')
         if action == 'Login':
             email = request.form.get('email', '').strip().lower()
@@ -397,6 +466,7 @@ def logout():
     return redirect(url_for('index'))
 
 @app.route('/stt', methods=['POST'])
+@admission_controlled('stt', login_required=False)
 def stt():
     if 'audio' not in request.files:
         return {'error': 'No audio file provided'}, 400
@@ -409,6 +479,7 @@ def stt():
     return {'text': text}
 
 @app.route('/tts', methods=['POST'])
+@admission_controlled('tts', login_required=False)
 def tts():
     text = request.form.get('text', '')
     if not text:
@@ -424,6 +495,7 @@ def tts():
 from flask import jsonify
 
 @app.route('/api/chat', methods=['POST'])
+@admission_controlled('chat')
 def api_chat():
     user_email = session.get('user_email')
     if not user_email:
@@ -519,6 +591,7 @@ def api_chat():
     return jsonify({'answer': ai_message, 'answer_html': ai_message_html})
 
 @app.route('/api/upload', methods=['POST'])
+@admission_controlled('upload')
 def api_upload():
     user_email = session.get('user_email')
     if not user_email:
@@ -636,27 +709,91 @@ def api_files():
 # --- New Chat and Chat History Endpoints ---
 from flask import g
 
+def build_chat_preview(history, started_at, ended_at):
+    return {
+        'started_at': started_at,
+        'ended_at': ended_at,
+        'length': len(history),
+        'first': history[0]['content'][:CHAT_PREVIEW_LENGTH] if history else '',
+        'last': history[-1]['content'][:CHAT_PREVIEW_LENGTH] if history else ''
+    }
+
+def ensure_chat_archives_index():
+    # Built on first use rather than at import, so startup never blocks on Mongo
+    global chat_archives_index_ready
+    if chat_archives_index_ready:
+        return
+    try:
+        chat_archives.create_index([("user_id", 1), ("index", 1)], unique=True)
+        chat_archives_index_ready = True
+    except PyMongoError as e:
+        print(f"Error creating chat_archives index: {e}")
+
+def archive_current_chat(user_email, now):
+    # Swap out the current history and reserve its archive index in one atomic
+    # write, so concurrent New Chat clicks or chat messages can't double-archive or lose it
+    user_chat = chats.find_one_and_update(
+        {"user_id": user_email, "history.0": {"$exists": True}},
+        {"$set": {"history": [], "current_chat_started_at": now}, "$inc": {"archived_chats_count": 1}},
+        projection={"history": 1, "current_chat_started_at": 1, "archived_chats_count": 1},
+        return_document=ReturnDocument.BEFORE
+    )
+    if not user_chat:
+        return None
+    ensure_chat_archives_index()
+    history = user_chat['history']
+    started_at = user_chat.get('current_chat_started_at') or history[0].get('timestamp', now)
+    idx = user_chat.get('archived_chats_count') or 0
+    archive_entry = {"user_id": user_email, "index": idx, "history": history}
+    archive_entry.update(build_chat_preview(history, started_at, now))
+    chat_archives.insert_one(archive_entry)
+    return idx
+
+def migrate_legacy_chats_history(user_email):
+    # Chats archived before chat_archives existed were pushed onto the user document.
+    # Only probe once per session; after that the user document has no chats_history.
+    if session.get('chats_history_migrated'):
+        return
+    ensure_chat_archives_index()
+    user_chat = chats.find_one({"user_id": user_email, "chats_history": {"$exists": True}}, {"chats_history": 1})
+    if not user_chat:
+        session['chats_history_migrated'] = True
+        return
+    legacy = user_chat.get('chats_history') or []
+    # Legacy listings skipped empty chats, so keep their positions but drop them here
+    entries = []
+    for i, chat in enumerate(legacy):
+        history = chat.get('history') or []
+        if not history:
+            continue
+        entry = {"user_id": user_email, "index": i, "history": history}
+        entry.update(build_chat_preview(history, chat.get('started_at'), chat.get('ended_at')))
+        entries.append(entry)
+    if entries:
+        try:
+            chat_archives.bulk_write(
+                [UpdateOne({"user_id": user_email, "index": e['index']}, {"$setOnInsert": e}, upsert=True) for e in entries],
+                ordered=False
+            )
+        except BulkWriteError as e:
+            # Duplicate keys mean a concurrent request migrated those entries first
+            if any(err.get('code') != 11000 for err in e.details.get('writeErrors', [])):
+                raise
+    chats.update_one(
+        {"_id": user_chat["_id"]},
+        {"$unset": {"chats_history": ""}, "$max": {"archived_chats_count": len(legacy)}}
+    )
+    session['chats_history_migrated'] = True
+
 @app.route('/api/new_chat', methods=['POST'])
 def api_new_chat():
     user_email = session.get('user_email')
     if not user_email:
         return jsonify({'error': 'Not logged in'}), 401
-    user_chat = chats.find_one({"user_id": user_email})
+    migrate_legacy_chats_history(user_email)
     now = datetime.utcnow()
     # Archive current chat if it exists and is non-empty
-    if user_chat and 'history' in user_chat and user_chat['history']:
-        started_at = user_chat.get('current_chat_started_at') or user_chat['history'][0].get('timestamp', now)
-        ended_at = now
-        archive_entry = {
-            'history': user_chat['history'],
-            'started_at': started_at,
-            'ended_at': ended_at
-        }
-        chats.update_one(
-            {"user_id": user_email},
-            {"$push": {"chats_history": archive_entry}, "$set": {"history": [], "current_chat_started_at": now}}
-        )
-    else:
+    if archive_current_chat(user_email, now) is None:
         chats.update_one({"user_id": user_email}, {"$set": {"history": [], "current_chat_started_at": now}}, upsert=True)
     session['current_chat'] = []
     return jsonify({'success': True})
@@ -666,34 +803,38 @@ def api_chats_history():
     user_email = session.get('user_email')
     if not user_email:
         return jsonify({'error': 'Not logged in'}), 401
-    user_chat = chats.find_one({"user_id": user_email})
-    chats_history = user_chat.get('chats_history', []) if user_chat else []
-    # Only return metadata and first/last message for preview
-    preview = []
-    for chat in chats_history:
-        if not chat['history']:
-            continue
-        first = chat['history'][0]['content'] if chat['history'] else ''
-        last = chat['history'][-1]['content'] if chat['history'] else ''
-        preview.append({
-            'started_at': chat.get('started_at'),
-            'ended_at': chat.get('ended_at'),
-            'length': len(chat['history']),
-            'first': first,
-            'last': last
-        })
-    return jsonify({'chats_history': preview})
+    cursor = request.args.get('cursor', type=int)
+    limit = request.args.get('limit', CHATS_HISTORY_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, CHATS_HISTORY_MAX_PAGE_SIZE))
+    migrate_legacy_chats_history(user_email)
+    query = {"user_id": user_email}
+    if cursor is not None:
+        query["index"] = {"$lt": cursor}
+    # Only return metadata and first/last message for preview, newest first
+    results = list(chat_archives.find(query, {"_id": 0, "user_id": 0, "history": 0}).sort("index", -1).limit(limit + 1))
+    preview = results[:limit]
+    next_cursor = preview[-1]['index'] if len(results) > limit else None
+    return jsonify({'chats_history': preview, 'next_cursor': next_cursor})
 
 @app.route('/api/chats_history/<int:idx>', methods=['GET'])
 def api_get_chat_by_index(idx):
     user_email = session.get('user_email')
     if not user_email:
         return jsonify({'error': 'Not logged in'}), 401
-    user_chat = chats.find_one({"user_id": user_email})
-    chats_history = user_chat.get('chats_history', []) if user_chat else []
-    if idx < 0 or idx >= len(chats_history):
+    migrate_legacy_chats_history(user_email)
+    chat = chat_archives.find_one({"user_id": user_email, "index": idx}, {"history": 1, "started_at": 1, "ended_at": 1})
+    if not chat:
         return jsonify({'error': 'Invalid chat index'}), 404
-    return jsonify({'history': chats_history[idx]['history'], 'started_at': chats_history[idx].get('started_at'), 'ended_at': chats_history[idx].get('ended_at')})
+    return jsonify({'history': chat['history'], 'started_at': chat.get('started_at'), 'ended_at': chat.get('ended_at')})
+
+@app.route('/api/admission_stats', methods=['GET'])
+def api_admission_stats():
+    user_email = session.get('user_email')
+    if not user_email:
+        return jsonify({'error': 'Not logged in'}), 401
+    if user_email not in ADMIN_EMAILS:
+        return jsonify({'error': 'Forbidden'}), 403
+    return jsonify({name: limiter.stats() for name, limiter in limiters.items()})
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -13,8 +13,9 @@ function App() {
   });
   const [sidebarOpen, setSidebarOpen] = useState(true);
   const [recentChats, setRecentChats] = useState([]); // Will hold chat session metadata
+  const [chatsCursor, setChatsCursor] = useState(null); // Cursor for the next (older) page of chats
   const [chatKey, setChatKey] = useState(0); // For forcing Chatbot remount
-  const [activeChatIdx, setActiveChatIdx] = useState(null); // null = new chat, else index in recentChats
+  const [activeChatIdx, setActiveChatIdx] = useState(null); // null = new chat, else archived chat index
   const [loadingChats, setLoadingChats] = useState(false);
   const [dropdownOpen, setDropdownOpen] = useState(false);
   const [initialMessages, setInitialMessages] = useState([]);
@@ -55,12 +56,20 @@ function App() {
     setDropdownOpen(v => !v);
     if (!dropdownOpen && recentChats.length === 0) {
       setLoadingChats(true);
-      const chats = await getChatsHistory();
+      const { chats, next_cursor } = await getChatsHistory();
       setRecentChats(chats);
+      setChatsCursor(next_cursor);
       setLoadingChats(false);
     }
   };
 
+  // Handler to load the next page of older chats
+  const handleLoadMoreChats = async () => {
+    const { chats, next_cursor } = await getChatsHistory(chatsCursor);
+    setRecentChats(prev => [...prev, ...chats]);
+    setChatsCursor(next_cursor);
+  };
+
   // Handler to continue a specific chat session
   const handleContinueChat = async (idx) => {
     setLoadingChats(true);
@@ -101,11 +110,16 @@ function App() {
                         ) : (
                           <ul className="chat-list">
                             {recentChats.map((chat, idx) => (
-                              <li key={idx} className="dropdown-item chat-item" onClick={() => handleContinueChat(idx)}>
+                              <li key={idx} className="dropdown-item chat-item" onClick={() => handleContinueChat(chat.index ?? idx)}>
                                 <div className="chat-title">{chat.first ? chat.first.slice(0, 40) : 'Untitled Chat'}</div>
                                 <div className="chat-date">{chat.started_at ? new Date(chat.started_at).toLocaleString() : ''}</div>
                               </li>
                             ))}
+                            {chatsCursor !== null && (
+                              <li className="dropdown-item chat-item" onClick={handleLoadMoreChats}>
+                                <div className="chat-title">Load more...</div>
+                              </li>
+                            )}
                           </ul>
                         )
                       )}
@@ -91,12 +91,14 @@ export async function startNewChat() {
   return await res.json();
 }
 
-// Fetch all previous chats (metadata only)
-export async function getChatsHistory() {
-  const res = await fetchWithCreds(`${API_BASE}/api/chats_history`);
-  if (!res.ok) return [];
+// Fetch a page of previous chats (metadata only), newest first; pass next_cursor to get older ones
+export async function getChatsHistory(cursor = null, limit = 50) {
+  const params = new URLSearchParams({ limit });
+  if (cursor !== null && cursor !== undefined) params.append('cursor', cursor);
+  const res = await fetchWithCreds(`${API_BASE}/api/chats_history?${params}`);
+  if (!res.ok) return { chats: [], next_cursor: null };
   const data = await res.json();
-  return data.chats_history || [];
+  return { chats: data.chats_history || [], next_cursor: data.next_cursor ?? null };
 }
 
 // Fetch a specific previous chat by index
@@ -0,0 +1,107 @@
+import threading
+import time
+
+from admission import EndpointLimiter, admission
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError('condition not reached')
+        time.sleep(0.005)
+
+
+def acquire_in_thread(limiter, user, results):
+    thread = threading.Thread(target=lambda: results.__setitem__(user, limiter.acquire(user)))
+    thread.start()
+    return thread
+
+
+def test_release_hands_slot_to_oldest_waiter():
+    limiter = EndpointLimiter('test', max_concurrent=1, max_queue=2, per_user=1, queue_timeout=2)
+    results = {}
+    assert limiter.acquire('a') is None
+    first = acquire_in_thread(limiter, 'b', results)
+    wait_until(lambda: len(limiter.waiters) == 1)
+    # Arrive between release() and the woken waiter running: the slot must not be stolen
+    with limiter.cond:
+        limiter.release('a')
+        late = acquire_in_thread(limiter, 'c', results)
+    first.join()
+    assert results['b'] is None
+    wait_until(lambda: len(limiter.waiters) == 1)
+    assert 'c' not in results
+    assert limiter.active == 1
+    limiter.release('b')
+    late.join()
+    assert results['c'] is None
+    limiter.release('c')
+    assert limiter.active == 0
+
+
+def test_queue_full_when_queue_at_max():
+    limiter = EndpointLimiter('test', max_concurrent=1, max_queue=1, per_user=5, queue_timeout=2)
+    results = {}
+    assert limiter.acquire('a') is None
+    waiter = acquire_in_thread(limiter, 'b', results)
+    wait_until(lambda: len(limiter.waiters) == 1)
+    assert limiter.acquire('c') == 'queue_full'
+    assert limiter.stats()['rejected']['queue_full'] == 1
+    assert 'c' not in limiter.user_inflight
+    limiter.release('a')
+    waiter.join()
+    limiter.release('b')
+    assert limiter.active == 0
+
+
+def test_queue_timeout_removes_waiter_and_frees_user():
+    limiter = EndpointLimiter('test', max_concurrent=1, max_queue=2, per_user=1, queue_timeout=0.05)
+    assert limiter.acquire('a') is None
+    assert limiter.acquire('b') == 'queue_timeout'
+    assert len(limiter.waiters) == 0
+    assert 'b' not in limiter.user_inflight
+    limiter.release('a')
+    assert limiter.active == 0
+    assert limiter.acquire('b') is None
+
+
+def test_user_limit_counts_queued_requests():
+    limiter = EndpointLimiter('test', max_concurrent=1, max_queue=2, per_user=1, queue_timeout=2)
+    results = {}
+    assert limiter.acquire('a') is None
+    waiter = acquire_in_thread(limiter, 'b', results)
+    wait_until(lambda: len(limiter.waiters) == 1)
+    assert limiter.acquire('b') == 'user_limit'
+    assert limiter.retry_after('user_limit') == EndpointLimiter.USER_LIMIT_RETRY_AFTER
+    limiter.release('a')
+    waiter.join()
+    limiter.release('b')
+
+
+def test_active_returns_to_zero_under_load():
+    limiter = EndpointLimiter('test', max_concurrent=3, max_queue=5, per_user=100, queue_timeout=1)
+    lock = threading.Lock()
+    running = [0, 0]
+
+    def job(i):
+        with admission(limiter, i % 7) as reason:
+            if reason:
+                return
+            with lock:
+                running[0] += 1
+                running[1] = max(running[1], running[0])
+            time.sleep(0.005)
+            with lock:
+                running[0] -= 1
+
+    threads = [threading.Thread(target=job, args=(i,)) for i in range(100)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert running[1] <= 3
+    stats = limiter.stats()
+    assert stats['active'] == 0
+    assert stats['queue_depth'] == 0
+    assert limiter.user_inflight == {}